@@ -278,12 +278,13 @@ creating a new topic when other information other than a topic name is
 exchanged in the relation databag.
 """
 
+import hashlib
 import json
 import logging
 from abc import ABC, ABCMeta, abstractmethod
 from collections import namedtuple
-from datetime import datetime
-from typing import List, Optional
+from functools import cached_property
+from typing import FrozenSet, List, Optional, Tuple
 
 from ops.charm import (
     CharmBase,
@@ -293,7 +294,7 @@ from ops.charm import (
     RelationJoinedEvent,
 )
 from ops.framework import EventSource, Object, _Metaclass
-from ops.model import Relation
+from ops.model import Relation, RelationDataContent
 
 # The unique Charmhub library identifier, never change it
 LIBID = "6c3e6b6680d64e9c89e611d1a15f65be"
@@ -303,10 +304,26 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version
-LIBPATCH = 1
+LIBPATCH = 2
 
 logger = logging.getLogger(__name__)
 
+# Use orjson to (de)serialize the diff data when it is available in the charm,
+# falling back to the standard library with the same compact output otherwise.
+try:
+    import orjson
+
+    def _dumps(obj: dict) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode()
+
+    _loads = orjson.loads
+except ImportError:
+
+    def _dumps(obj: dict) -> str:
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"))
+
+    _loads = json.loads
+
 
 Diff = namedtuple("Diff", "added changed deleted")
 Diff.__doc__ = """
@@ -317,9 +334,35 @@ changed - keys that still exist but have new values
 deleted - key that were deleted"""
 
 
+def _digest(value: str) -> str:
+    """Returns the SHA-256 hex digest of a relation databag value."""
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _update_databag(databag: RelationDataContent, data: dict) -> None:
+    """Writes to the databag only the key-value pairs that differ from its content.
+
+    Every key written is a separate relation-set call, so the keys that
+    already hold the same value are skipped. The other values are still
+    validated by the databag when they are written.
+
+    Args:
+        databag: the relation databag to update.
+        data: dict containing the key-value pairs to write.
+    """
+    updates = {
+        key: value for key, value in data.items() if key not in databag or databag[key] != value
+    }
+    if updates:
+        databag.update(updates)
+
+
 def diff(event: RelationChangedEvent, bucket: str) -> Diff:
     """Retrieves the diff of the data in the relation changed databag.
 
+    Only a digest of each value is stored in the data key of the databag,
+    which keeps it small even when large values (like TLS CAs) are shared.
+
     Args:
         event: relation changed event.
         bucket: bucket of the databag (app or unit)
@@ -328,22 +371,41 @@ def diff(event: RelationChangedEvent, bucket: str) -> Diff:
         a Diff instance containing the added, deleted and changed
             keys from the event relation databag.
     """
-    # Retrieve the old data from the data key in the application relation databag.
-    old_data = json.loads(event.relation.data[bucket].get("data", "{}"))
-    # Retrieve the new data from the event relation databag.
-    new_data = {
-        key: value for key, value in event.relation.data[event.app].items() if key != "data"
-    }
+    # Look up both databags once and reuse them for every read and write below.
+    local_databag = event.relation.data[bucket]
+    remote_databag = event.relation.data[event.app]
 
-    # These are the keys that were added to the databag and triggered this event.
-    added = new_data.keys() - old_data.keys()
-    # These are the keys that were removed from the databag and triggered this event.
-    deleted = old_data.keys() - new_data.keys()
-    # These are the keys that already existed in the databag,
-    # but had their values changed.
-    changed = {key for key in old_data.keys() & new_data.keys() if old_data[key] != new_data[key]}
-    # Convert the new_data to a serializable format and save it for a next diff check.
-    event.relation.data[bucket].update({"data": json.dumps(new_data)})
+    # Retrieve the old data from the data key in the local relation databag.
+    old_serialized = local_databag.get("data")
+    # Retrieve the new data from the event relation databag.
+    new_data = {key: value for key, value in remote_databag.items() if key != "data"}
+    new_digests = {key: _digest(value) for key, value in new_data.items()}
+    new_serialized = _dumps(new_digests)
+
+    # Nothing changed since the last diff check, so there is nothing
+    # to emit and no need to write the same data back to the databag.
+    if new_serialized == old_serialized:
+        return Diff(set(), set(), set())
+
+    # Nothing was stored yet on the first event of a relation, so skip the parser.
+    old_data = _loads(old_serialized) if old_serialized else {}
+
+    # Classify the keys:
+    # - added: keys that were added to the databag and triggered this event.
+    # - deleted: keys that were removed from the databag and triggered this event.
+    # - changed: keys that already existed in the databag, but had their values
+    #   changed (the stored value may still be a raw value written by a previous
+    #   version of this library).
+    added, changed = set(), set()
+    for key, value in new_data.items():
+        if key not in old_data:
+            added.add(key)
+        elif old_data[key] not in (new_digests[key], value):
+            changed.add(key)
+    deleted = {key for key in old_data if key not in new_data}
+
+    # Save the digests of the new data for a next diff check.
+    local_databag.update({"data": new_serialized})
 
     # Return the diff with all possible changes.
     return Diff(added, changed, deleted)
@@ -419,7 +481,7 @@ class DataProvides(Object, ABC, metaclass=_AbstractMetaclass):
         """
         if self.local_unit.is_leader():
             relation = self.charm.model.get_relation(self.relation_name, relation_id)
-            relation.data[self.local_app].update(data)
+            _update_databag(relation.data[self.local_app], data)
 
     @property
     def relations(self) -> List[Relation]:
@@ -467,6 +529,11 @@ class DataProvides(Object, ABC, metaclass=_AbstractMetaclass):
 class DataRequires(Object, ABC, metaclass=_AbstractMetaclass):
     """Requires-side of the relation."""
 
+    # Rules checked in order against the diff of each relation changed event, as
+    # (keys, only_added, event name) tuples. A rule matches when all its keys were
+    # added (or either added or changed, if only_added is False) to the databag.
+    _event_rules: List[Tuple[FrozenSet[str], bool, str]] = []
+
     def __init__(
         self,
         charm,
@@ -492,9 +559,40 @@ class DataRequires(Object, ABC, metaclass=_AbstractMetaclass):
         """Event emitted when the application joins the relation."""
         raise NotImplementedError
 
-    @abstractmethod
     def _on_relation_changed_event(self, event: RelationChangedEvent) -> None:
-        raise NotImplementedError
+        """Event emitted when the relation has changed.
+
+        Emits the event of the first rule in _event_rules matching the diff.
+        """
+        # Check which data has changed to emit customs events.
+        diff = self._diff(event)
+
+        # Keys that were either added or changed, for the rules that accept both.
+        updated = diff.added | diff.changed
+
+        for keys, only_added, event_name in self._event_rules:
+            if keys <= (diff.added if only_added else updated):
+                # Emit the default event (the one without an alias).
+                logger.info("emitting %s event", event_name)
+                getattr(self.on, event_name).emit(event.relation, app=event.app, unit=event.unit)
+
+                # Emit the aliased event (if any).
+                self._emit_aliased_event(event, event_name)
+
+                # To avoid unnecessary application restarts only
+                # the event of the first matching rule is emitted.
+                return
+
+    def _emit_aliased_event(self, event: RelationChangedEvent, event_name: str) -> None:
+        """Emit an aliased event to a particular relation if it has an alias.
+
+        Relation aliases are not supported by default, so no event is emitted.
+
+        Args:
+            event: the relation changed event that was received.
+            event_name: the name of the event to emit.
+        """
+        pass
 
     def fetch_relation_data(self) -> dict:
         """Retrieves data from relation.
@@ -526,7 +624,7 @@ class DataRequires(Object, ABC, metaclass=_AbstractMetaclass):
         """
         if self.local_unit.is_leader():
             relation = self.charm.model.get_relation(self.relation_name, relation_id)
-            relation.data[self.local_app].update(data)
+            _update_databag(relation.data[self.local_app], data)
 
     def _diff(self, event: RelationChangedEvent) -> Diff:
         """Retrieves the diff of the data in the relation changed databag.
@@ -549,49 +647,58 @@ class DataRequires(Object, ABC, metaclass=_AbstractMetaclass):
 # General events
 
 
-class ExtraRoleEvent(RelationEvent):
+class _RelationDataEvent(RelationEvent):
+    """Base class for events that read fields from the remote application databag."""
+
+    @cached_property
+    def _databag(self) -> RelationDataContent:
+        """Returns the remote application databag, memoized for the lifetime of the event."""
+        return self.relation.data[self.relation.app]
+
+
+class ExtraRoleEvent(_RelationDataEvent):
     """Base class for data events."""
 
     @property
     def extra_user_roles(self) -> Optional[str]:
         """Returns the extra user roles that were requested."""
-        return self.relation.data[self.relation.app].get("extra-user-roles")
+        return self._databag.get("extra-user-roles")
 
 
-class AuthenticationEvent(RelationEvent):
+class AuthenticationEvent(_RelationDataEvent):
     """Base class for authentication fields for events."""
 
     @property
     def username(self) -> Optional[str]:
         """Returns the created username."""
-        return self.relation.data[self.relation.app].get("username")
+        return self._databag.get("username")
 
     @property
     def password(self) -> Optional[str]:
         """Returns the password for the created user."""
-        return self.relation.data[self.relation.app].get("password")
+        return self._databag.get("password")
 
     @property
     def tls(self) -> Optional[str]:
         """Returns whether TLS is configured."""
-        return self.relation.data[self.relation.app].get("tls")
+        return self._databag.get("tls")
 
     @property
     def tls_ca(self) -> Optional[str]:
         """Returns TLS CA."""
-        return self.relation.data[self.relation.app].get("tls-ca")
+        return self._databag.get("tls-ca")
 
 
 # Database related events and fields
 
 
-class DatabaseProvidesEvent(RelationEvent):
+class DatabaseProvidesEvent(_RelationDataEvent):
     """Base class for database events."""
 
     @property
     def database(self) -> Optional[str]:
         """Returns the database that was requested."""
-        return self.relation.data[self.relation.app].get("database")
+        return self._databag.get("database")
 
 
 class DatabaseRequestedEvent(DatabaseProvidesEvent, ExtraRoleEvent):
@@ -607,18 +714,18 @@ class DatabaseProvidesEvents(CharmEvents):
     database_requested = EventSource(DatabaseRequestedEvent)
 
 
-class DatabaseRequiresEvent(RelationEvent):
+class DatabaseRequiresEvent(_RelationDataEvent):
     """Base class for database events."""
 
     @property
     def endpoints(self) -> Optional[str]:
         """Returns a comma separated list of read/write endpoints."""
-        return self.relation.data[self.relation.app].get("endpoints")
+        return self._databag.get("endpoints")
 
     @property
     def read_only_endpoints(self) -> Optional[str]:
         """Returns a comma separated list of read only endpoints."""
-        return self.relation.data[self.relation.app].get("read-only-endpoints")
+        return self._databag.get("read-only-endpoints")
 
     @property
     def replset(self) -> Optional[str]:
@@ -626,7 +733,7 @@ class DatabaseRequiresEvent(RelationEvent):
 
         MongoDB only.
         """
-        return self.relation.data[self.relation.app].get("replset")
+        return self._databag.get("replset")
 
     @property
     def uris(self) -> Optional[str]:
@@ -634,7 +741,7 @@ class DatabaseRequiresEvent(RelationEvent):
 
         MongoDB, Redis, OpenSearch.
         """
-        return self.relation.data[self.relation.app].get("uris")
+        return self._databag.get("uris")
 
     @property
     def version(self) -> Optional[str]:
@@ -642,7 +749,7 @@ class DatabaseRequiresEvent(RelationEvent):
 
         Version as informed by the database daemon.
         """
-        return self.relation.data[self.relation.app].get("version")
+        return self._databag.get("version")
 
 
 class DatabaseCreatedEvent(AuthenticationEvent, DatabaseRequiresEvent):
@@ -668,6 +775,14 @@ class DatabaseRequiresEvents(CharmEvents):
     read_only_endpoints_changed = EventSource(DatabaseReadOnlyEndpointsChangedEvent)
 
 
+# Suffixes and classes of the custom events defined for each relation alias.
+_DB_ALIAS_EVENTS = (
+    ("database_created", DatabaseCreatedEvent),
+    ("endpoints_changed", DatabaseEndpointsChangedEvent),
+    ("read_only_endpoints_changed", DatabaseReadOnlyEndpointsChangedEvent),
+)
+
+
 # Database Provider and Requires
 
 
@@ -754,6 +869,17 @@ class DatabaseRequires(DataRequires):
 
     on = DatabaseRequiresEvents()
 
+    _event_rules = [
+        # The database was created (the database charm shared the credentials).
+        (frozenset({"username", "password"}), True, "database_created"),
+        # The database added or changed the endpoints in the relation databag.
+        # Not triggered together with “database_created“ to avoid restarts.
+        (frozenset({"endpoints"}), False, "endpoints_changed"),
+        # The database added or changed the read only endpoints in the relation databag.
+        # Not triggered together with “endpoints_changed“ to avoid restarts.
+        (frozenset({"read-only-endpoints"}), False, "read_only_endpoints_changed"),
+    ]
+
     def __init__(
         self,
         charm,
@@ -779,14 +905,8 @@ class DatabaseRequires(DataRequires):
                 )
 
             for relation_alias in relations_aliases:
-                self.on.define_event(f"{relation_alias}_database_created", DatabaseCreatedEvent)
-                self.on.define_event(
-                    f"{relation_alias}_endpoints_changed", DatabaseEndpointsChangedEvent
-                )
-                self.on.define_event(
-                    f"{relation_alias}_read_only_endpoints_changed",
-                    DatabaseReadOnlyEndpointsChangedEvent,
-                )
+                for event_suffix, event_type in _DB_ALIAS_EVENTS:
+                    self.on.define_event(f"{relation_alias}_{event_suffix}", event_type)
 
     def _assign_relation_alias(self, relation_id: int) -> None:
         """Assigns an alias to a relation.
@@ -802,24 +922,24 @@ class DatabaseRequires(DataRequires):
 
         # Return if an alias was already assigned to this relation
         # (like when there are more than one unit joining the relation).
-        if (
-            self.charm.model.get_relation(self.relation_name, relation_id)
-            .data[self.local_unit]
-            .get("alias")
-        ):
+        target = self.charm.model.get_relation(self.relation_name, relation_id)
+        if target.data[self.local_unit].get("alias"):
             return
 
         # Retrieve the available aliases (the ones that weren't assigned to any relation).
-        available_aliases = self.relations_aliases[:]
-        for relation in self.charm.model.relations[self.relation_name]:
+        taken_aliases = set()
+        for relation in self.relations:
             alias = relation.data[self.local_unit].get("alias")
             if alias:
                 logger.debug("Alias %s was already assigned to relation %d", alias, relation.id)
-                available_aliases.remove(alias)
+                taken_aliases.add(alias)
+        # Keep the order in which the aliases were provided to assign them deterministically.
+        available_aliases = [
+            alias for alias in self.relations_aliases if alias not in taken_aliases
+        ]
 
         # Set the alias in the unit relation databag of the specific relation.
-        relation = self.charm.model.get_relation(self.relation_name, relation_id)
-        relation.data[self.local_unit].update({"alias": available_aliases[0]})
+        target.data[self.local_unit].update({"alias": available_aliases[0]})
 
     def _emit_aliased_event(self, event: RelationChangedEvent, event_name: str) -> None:
         """Emit an aliased event to a particular relation if it has an alias.
@@ -843,7 +963,9 @@ class DatabaseRequires(DataRequires):
         Returns:
             the relation alias or None if the relation was not found.
         """
-        for relation in self.charm.model.relations[self.relation_name]:
+        # Model.get_relation builds a relation even for an unknown id, so look the
+        # relation up among the existing ones before reading its databag.
+        for relation in self.relations:
             if relation.id == relation_id:
                 return relation.data[self.local_unit].get("alias")
         return None
@@ -866,62 +988,17 @@ class DatabaseRequires(DataRequires):
         else:
             self._update_relation_data(event.relation.id, {"database": self.database})
 
-    def _on_relation_changed_event(self, event: RelationChangedEvent) -> None:
-        """Event emitted when the database relation has changed."""
-        # Check which data has changed to emit customs events.
-        diff = self._diff(event)
-
-        # Check if the database is created
-        # (the database charm shared the credentials).
-        if "username" in diff.added and "password" in diff.added:
-            # Emit the default event (the one without an alias).
-            logger.info("database created at %s", datetime.now())
-            self.on.database_created.emit(event.relation, app=event.app, unit=event.unit)
-
-            # Emit the aliased event (if any).
-            self._emit_aliased_event(event, "database_created")
-
-            # To avoid unnecessary application restarts do not trigger
-            # “endpoints_changed“ event if “database_created“ is triggered.
-            return
-
-        # Emit an endpoints changed event if the database
-        # added or changed this info in the relation databag.
-        if "endpoints" in diff.added or "endpoints" in diff.changed:
-            # Emit the default event (the one without an alias).
-            logger.info("endpoints changed on %s", datetime.now())
-            self.on.endpoints_changed.emit(event.relation, app=event.app, unit=event.unit)
-
-            # Emit the aliased event (if any).
-            self._emit_aliased_event(event, "endpoints_changed")
-
-            # To avoid unnecessary application restarts do not trigger
-            # “read_only_endpoints_changed“ event if “endpoints_changed“ is triggered.
-            return
-
-        # Emit a read only endpoints changed event if the database
-        # added or changed this info in the relation databag.
-        if "read-only-endpoints" in diff.added or "read-only-endpoints" in diff.changed:
-            # Emit the default event (the one without an alias).
-            logger.info("read-only-endpoints changed on %s", datetime.now())
-            self.on.read_only_endpoints_changed.emit(
-                event.relation, app=event.app, unit=event.unit
-            )
-
-            # Emit the aliased event (if any).
-            self._emit_aliased_event(event, "read_only_endpoints_changed")
-
 
 # Kafka related events
 
 
-class KafkaProvidesEvent(RelationEvent):
+class KafkaProvidesEvent(_RelationDataEvent):
     """Base class for Kafka events."""
 
     @property
     def topic(self) -> Optional[str]:
         """Returns the topic that was requested."""
-        return self.relation.data[self.relation.app].get("topic")
+        return self._databag.get("topic")
 
 
 class TopicRequestedEvent(KafkaProvidesEvent, ExtraRoleEvent):
@@ -937,23 +1014,23 @@ class KafkaProvidesEvents(CharmEvents):
     topic_requested = EventSource(TopicRequestedEvent)
 
 
-class KafkaRequiresEvent(RelationEvent):
+class KafkaRequiresEvent(_RelationDataEvent):
     """Base class for Kafka events."""
 
     @property
     def bootstrap_server(self) -> Optional[str]:
         """Returns a a comma-seperated list of broker uris."""
-        return self.relation.data[self.relation.app].get("endpoints")
+        return self._databag.get("endpoints")
 
     @property
     def consumer_group_prefix(self) -> Optional[str]:
         """Returns the consumer-group-prefix."""
-        return self.relation.data[self.relation.app].get("consumer-group-prefix")
+        return self._databag.get("consumer-group-prefix")
 
     @property
     def zookeeper_uris(self) -> Optional[str]:
         """Returns a comma separated list of Zookeeper uris."""
-        return self.relation.data[self.relation.app].get("zookeeper-uris")
+        return self._databag.get("zookeeper-uris")
 
 
 class TopicCreatedEvent(AuthenticationEvent, KafkaRequiresEvent):
@@ -1032,6 +1109,14 @@ class KafkaRequires(DataRequires):
 
     on = KafkaRequiresEvents()
 
+    _event_rules = [
+        # The topic was created (the Kafka charm shared the credentials).
+        (frozenset({"username", "password"}), True, "topic_created"),
+        # The Kafka endpoints (bootstrap-server) were added or changed in the relation databag.
+        # Not triggered together with “topic_created“ to avoid restarts.
+        (frozenset({"endpoints"}), False, "bootstrap_server_changed"),
+    ]
+
     def __init__(self, charm, relation_name: str, topic: str, extra_user_roles: str = None):
         """Manager of Kafka client relations."""
         # super().__init__(charm, relation_name)
@@ -1052,29 +1137,3 @@ class KafkaRequires(DataRequires):
             if self.extra_user_roles is not None
             else {"topic": self.topic},
         )
-
-    def _on_relation_changed_event(self, event: RelationChangedEvent) -> None:
-        """Event emitted when the Kafka relation has changed."""
-        # Check which data has changed to emit customs events.
-        diff = self._diff(event)
-
-        # Check if the topic is created
-        # (the Kafka charm shared the credentials).
-        if "username" in diff.added and "password" in diff.added:
-            # Emit the default event (the one without an alias).
-            logger.info("topic created at %s", datetime.now())
-            self.on.topic_created.emit(event.relation, app=event.app, unit=event.unit)
-
-            # To avoid unnecessary application restarts do not trigger
-            # “endpoints_changed“ event if “topic_created“ is triggered.
-            return
-
-        # Emit an endpoints (bootstap-server) changed event if the Kakfa endpoints
-        # added or changed this info in the relation databag.
-        if "endpoints" in diff.added or "endpoints" in diff.changed:
-            # Emit the default event (the one without an alias).
-            logger.info("endpoints changed on %s", datetime.now())
-            self.on.bootstrap_server_changed.emit(
-                event.relation, app=event.app, unit=event.unit
-            )  # here check if this is the right design
-            return
@@ -140,7 +140,6 @@ class ApplicationCharm(CharmBase):
 import json
 import logging
 from collections import namedtuple
-from datetime import datetime
 from typing import List, Optional
 
 from ops.charm import (
@@ -160,7 +159,7 @@ LIBAPI = 0
 
 # Increment this PATCH version before using `charmcraft publish-lib` or reset
 # to 0 if you are raising the major API version.
-LIBPATCH = 4
+LIBPATCH = 5
 
 logger = logging.getLogger(__name__)
 
@@ -460,7 +459,7 @@ class DatabaseRequires(Object):
         # (the database charm shared the credentials).
         if "username" in diff.added and "password" in diff.added:
             # Emit the default event (the one without an alias).
-            logger.info("database created at %s", datetime.now())
+            logger.info("database created")
             self.on.database_created.emit(event.relation, app=event.app, unit=event.unit)
 
             # Emit the aliased event (if any).
@@ -474,7 +473,7 @@ class DatabaseRequires(Object):
         # added or changed this info in the relation databag.
         if "endpoints" in diff.added or "endpoints" in diff.changed:
             # Emit the default event (the one without an alias).
-            logger.info("endpoints changed on %s", datetime.now())
+            logger.info("endpoints changed")
             self.on.endpoints_changed.emit(event.relation, app=event.app, unit=event.unit)
 
             # Emit the aliased event (if any).
@@ -488,7 +487,7 @@ class DatabaseRequires(Object):
         # added or changed this info in the relation databag.
         if "read-only-endpoints" in diff.added or "read-only-endpoints" in diff.changed:
             # Emit the default event (the one without an alias).
-            logger.info("read-only-endpoints changed on %s", datetime.now())
+            logger.info("read-only-endpoints changed")
             self.on.read_only_endpoints_changed.emit(
                 event.relation, app=event.app, unit=event.unit
             )
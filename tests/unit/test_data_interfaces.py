@@ -1,11 +1,16 @@
 # Copyright 2022 Canonical Ltd.
 # See LICENSE file for licensing details.
+import importlib
+import json
+import sys
 import unittest
 from abc import ABC, abstractmethod
+from collections import deque
+from types import MappingProxyType
 from typing import Tuple
-from unittest.mock import Mock, patch
+from unittest.mock import DEFAULT, patch
 
-import pytest
+from charms.data_platform_libs.v0 import data_interfaces
 from charms.data_platform_libs.v0.data_interfaces import (
     DatabaseCreatedEvent,
     DatabaseEndpointsChangedEvent,
@@ -19,8 +24,9 @@ from charms.data_platform_libs.v0.data_interfaces import (
     KafkaRequires,
     TopicRequestedEvent,
 )
-from charms.harness_extensions.v0.capture_events import capture, capture_events
 from ops.charm import CharmBase
+from ops.framework import Object, ObjectEvents
+from ops.model import RelationDataTypeError
 from ops.testing import Harness
 from parameterized import parameterized
 
@@ -43,6 +49,102 @@ provides:
   {KAFKA_RELATION_NAME}:
     interface: {KAFKA_RELATION_INTERFACE}
 """
+# Relation data sent by the requirer applications to the provider tests (read-only).
+DATABASE_REQUEST = MappingProxyType({"database": DATABASE})
+TOPIC_REQUEST = MappingProxyType({"topic": TOPIC})
+
+
+# Sets of keys expected in the diffs computed by the charm library.
+NO_KEYS = frozenset()
+CREDENTIAL_KEYS = frozenset({"username", "password"})
+USERNAME_KEYS = frozenset({"username"})
+
+
+def snapshot_relation_data(harness: Harness, relation_name: str, rel_id: int) -> dict:
+    """Returns a copy of the state of a relation that the tests may change.
+
+    That is the leadership of the local unit, the ids of the relations with the
+    same name and the databags of all the applications and units in the relation.
+    """
+    relation = harness.model.get_relation(relation_name, rel_id)
+    entities = [harness.charm.app.name, harness.charm.unit.name, relation.app.name]
+    entities.extend(unit.name for unit in relation.units)
+    return {
+        "leader": harness.charm.unit.is_leader(),
+        "relation_ids": {relation.id for relation in harness.model.relations[relation_name]},
+        "databags": {
+            entity: dict(harness.get_relation_data(rel_id, entity)) for entity in entities
+        },
+    }
+
+
+def restore_relation_data(harness: Harness, relation_name: str, snapshot: dict, rel_id: int):
+    """Restores the state saved by snapshot_relation_data without firing any events."""
+    with harness.hooks_disabled():
+        harness.set_leader(snapshot["leader"])
+
+        # Remove the relations added during the test.
+        for relation in harness.model.relations[relation_name]:
+            if relation.id not in snapshot["relation_ids"]:
+                harness.remove_relation(relation.id)
+
+        # Only write the keys that were added, removed or changed during the test.
+        for entity, data in snapshot["databags"].items():
+            current = harness.get_relation_data(rel_id, entity)
+            delta = {key: "" for key in current if key not in data}
+            delta.update({key: value for key, value in data.items() if current.get(key) != value})
+            if delta:
+                harness.update_relation_data(rel_id, entity, delta)
+
+
+def assert_databag_contains(harness: Harness, rel_id: int, entity: str, expected: dict):
+    """Asserts the databag of an application or unit holds (at least) the expected data."""
+    databag = harness.get_relation_data(rel_id, entity)
+    assert {key: databag.get(key) for key in expected} == expected
+
+
+def event_to_dict(event, fields) -> dict:
+    """Returns the values of the given fields of a charm library event."""
+    return {field: getattr(event, field) for field in fields}
+
+
+class StubRelation:
+    """Relation stub holding only the attributes read by the charm library."""
+
+    __slots__ = ("id", "data")
+
+    def __init__(self, relation_id: int, data: dict):
+        self.id = relation_id
+        self.data = data
+
+
+class StubRelationEvent:
+    """Relation event stub holding only the attributes read by the charm library."""
+
+    __slots__ = ("app", "unit", "relation")
+
+    def __init__(self, app, relation, unit=None):
+        self.app = app
+        self.unit = unit
+        self.relation = relation
+
+
+class EventRecorder(Object):
+    """Records the events of the given types emitted on an event source.
+
+    It observes the events once, so the same recorder can be used by all the
+    tests of a class (its events are cleared before checking new ones).
+    """
+
+    def __init__(self, charm: CharmBase, source: ObjectEvents, types: Tuple[type, ...]):
+        super().__init__(charm, "event-recorder")
+        self.events = deque()
+        for bound_event in source.events().values():
+            if issubclass(bound_event.event_type, types):
+                self.framework.observe(bound_event, self._on_event)
+
+    def _on_event(self, event) -> None:
+        self.events.append(event)
 
 
 class DatabaseCharm(CharmBase):
@@ -76,47 +178,125 @@ class KafkaCharm(CharmBase):
 
 
 class DataProvidesBaseTests(ABC):
+    @classmethod
     @abstractmethod
-    def get_harness(self) -> Tuple[Harness, int]:
+    def get_harness(cls) -> Tuple[Harness, int]:
         pass
 
+    @classmethod
+    def setUpClass(cls):
+        # Setting up the harness (firing all the initial hooks) is the most expensive
+        # part of the tests, so it's done once and its state is restored after each test.
+        cls._harness, cls._rel_id = cls.get_harness()
+        cls._snapshot = snapshot_relation_data(cls._harness, cls.relation_name, cls._rel_id)
+        # Replace the charm event handlers with mocks once for all the tests.
+        cls._patcher = patch.multiple(cls.charm, **{name: DEFAULT for name in cls.handler_names})
+        cls.handlers = cls._patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._patcher.stop()
+        cls._harness.cleanup()
+
     def setUp(self):
-        self.harness, self.rel_id = self.get_harness()
+        self.harness, self.rel_id = self._harness, self._rel_id
+        for handler in self.handlers.values():
+            handler.reset_mock()
+        # The application whose databag is used by the tests.
+        self._app = self.harness.charm.model.get_app(self.app_name)
 
     def tearDown(self) -> None:
-        self.harness.cleanup()
+        restore_relation_data(self.harness, self.relation_name, self._snapshot, self.rel_id)
 
     def test_diff(self):
         """Asserts that the charm library correctly returns a diff of the relation data."""
-        # Define a mock relation changed event to be used in the subsequent diff calls.
-        mock_event = Mock()
-        # Set the app, id and the initial data for the relation.
-        mock_event.app = self.harness.charm.model.get_app(self.app_name)
-        mock_event.relation.id = self.rel_id
-        mock_event.relation.data = {
-            mock_event.app: {"username": "test-username", "password": "test-password"}
-        }
+        # Define a relation changed event to be used in the subsequent diff calls
+        # with the app, id and the initial data for the relation.
+        app = self._app
+        relation = StubRelation(
+            self.rel_id, {app: {"username": "test-username", "password": "test-password"}}
+        )
+        mock_event = StubRelationEvent(app, relation)
         # Use a variable to easily update the relation changed event data during the test.
         data = mock_event.relation.data[mock_event.app]
 
-        # Test with new data added to the relation databag.
-        result = self.harness.charm.provider._diff(mock_event)
-        assert result == Diff({"username", "password"}, set(), set())
+        # Each case is made of the changes to apply to the relation databag (a None value
+        # deletes the key) and the diff expected after them.
+        cases = [
+            # Test with new data added to the relation databag.
+            ({}, Diff(CREDENTIAL_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with the same data.
+            ({}, Diff(NO_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with changed data.
+            ({"username": "test-username-1"}, Diff(NO_KEYS, USERNAME_KEYS, NO_KEYS)),
+            # Test with the stored data reset (the previous data is always read from the databag).
+            ({"data": None}, Diff(CREDENTIAL_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with deleted data.
+            ({"username": None, "password": None}, Diff(NO_KEYS, NO_KEYS, CREDENTIAL_KEYS)),
+        ]
+        for changes, expected in cases:
+            for key, value in changes.items():
+                if value is None:
+                    del data[key]
+                else:
+                    data[key] = value
+            assert self.harness.charm.provider._diff(mock_event) == expected
+
+    def test_diff_with_raw_values_stored(self):
+        """Asserts that raw values stored by older library versions are not seen as changes."""
+        app = self._app
+        relation = StubRelation(
+            self.rel_id,
+            {
+                app: {
+                    "username": "test-username",
+                    "password": "test-password",
+                    "data": json.dumps({"username": "test-username", "password": "old-password"}),
+                }
+            },
+        )
+        mock_event = StubRelationEvent(app, relation)
 
-        # Test with the same data.
+        # Only the value that differs from the stored raw value is reported as changed.
         result = self.harness.charm.provider._diff(mock_event)
-        assert result == Diff(set(), set(), set())
+        assert result == Diff(NO_KEYS, {"password"}, NO_KEYS)
 
-        # Test with changed data.
-        data["username"] = "test-username-1"
-        result = self.harness.charm.provider._diff(mock_event)
-        assert result == Diff(set(), {"username"}, set())
+        # The data key now holds digests instead of the raw values.
+        stored = json.loads(mock_event.relation.data[mock_event.app]["data"])
+        assert "test-password" not in stored.values()
+        assert self.harness.charm.provider._diff(mock_event) == Diff(NO_KEYS, NO_KEYS, NO_KEYS)
 
-        # Test with deleted data.
-        del data["username"]
-        del data["password"]
-        result = self.harness.charm.provider._diff(mock_event)
-        assert result == Diff(set(), set(), {"username", "password"})
+    def test_diff_with_json_fallback(self):
+        """Asserts the json fallback stores and reads the same data as the default serializer."""
+
+        def run_diffs():
+            app = self._app
+            relation = StubRelation(
+                self.rel_id, {app: {"username": "test-username", "password": "test-password"}}
+            )
+            mock_event = StubRelationEvent(app, relation)
+            data = mock_event.relation.data[mock_event.app]
+            results = []
+            for changes in ({}, {"username": "test-username-1"}, {"tls-ca": "test-ca"}):
+                data.update(changes)
+                results.append((self.harness.charm.provider._diff(mock_event), data["data"]))
+            return results
+
+        expected = run_diffs()
+
+        # Reload the charm library without orjson to get its json fallback, then restore
+        # the module globals so that the other tests keep using the same classes.
+        module_globals = dict(data_interfaces.__dict__)
+        try:
+            with patch.dict(sys.modules, {"orjson": None}):
+                importlib.reload(data_interfaces)
+            fallback = {"_dumps": data_interfaces._dumps, "_loads": data_interfaces._loads}
+        finally:
+            data_interfaces.__dict__.update(module_globals)
+        assert fallback["_loads"] is json.loads
+
+        with patch.multiple(data_interfaces, **fallback):
+            assert run_diffs() == expected
 
     def test_set_credentials(self):
         """Asserts that the database name is in the relation databag when it's requested."""
@@ -130,6 +310,27 @@ class DataProvidesBaseTests(ABC):
             "password": "test-password",
         }
 
+    def test_set_credentials_skips_unchanged_keys(self):
+        """Asserts that only the keys holding a new value are written to the relation."""
+        self.harness.charm.provider.set_credentials(self.rel_id, "test-username", "test-password")
+
+        # Set the credentials again with only the password changed (the testing
+        # backend writes each key in update_relation_data, where Juju runs relation-set).
+        backend = self.harness._backend
+        with patch.object(
+            backend, "update_relation_data", wraps=backend.update_relation_data
+        ) as update_relation_data:
+            self.harness.charm.provider.set_credentials(
+                self.rel_id, "test-username", "new-password"
+            )
+        update_relation_data.assert_called_once_with(
+            self.rel_id, self.harness.charm.app, "password", "new-password"
+        )
+
+        # A missing key is still written, so an invalid value is rejected.
+        with self.assertRaises(RelationDataTypeError):
+            self.harness.charm.provider.set_tls(self.rel_id, None)
+
 
 class TestDatabaseProvides(DataProvidesBaseTests, unittest.TestCase):
 
@@ -137,27 +338,27 @@ class TestDatabaseProvides(DataProvidesBaseTests, unittest.TestCase):
     relation_name = DATABASE_RELATION_NAME
     app_name = "database"
     charm = DatabaseCharm
+    handler_names = ("_on_database_requested",)
 
-    def get_harness(self) -> Tuple[Harness, int]:
-        harness = Harness(self.charm, meta=self.metadata)
+    @classmethod
+    def get_harness(cls) -> Tuple[Harness, int]:
+        harness = Harness(cls.charm, meta=cls.metadata)
         # Set up the initial relation and hooks.
-        rel_id = harness.add_relation(self.relation_name, "application")
+        rel_id = harness.add_relation(cls.relation_name, "application")
         harness.add_relation_unit(rel_id, "application/0")
         harness.set_leader(True)
         harness.begin_with_initial_hooks()
         return harness, rel_id
 
-    @patch.object(DatabaseCharm, "_on_database_requested")
-    def emit_database_requested_event(self, _on_database_requested):
+    def emit_database_requested_event(self):
         # Emit the database requested event.
         relation = self.harness.charm.model.get_relation(DATABASE_RELATION_NAME, self.rel_id)
-        application = self.harness.charm.model.get_app("database")
-        self.harness.charm.provider.on.database_requested.emit(relation, application)
-        return _on_database_requested.call_args[0][0]
+        self.harness.charm.provider.on.database_requested.emit(relation, self._app)
+        return self.handlers["_on_database_requested"].call_args[0][0]
 
-    @patch.object(DatabaseCharm, "_on_database_requested")
-    def test_on_database_requested(self, _on_database_requested):
+    def test_on_database_requested(self):
         """Asserts that the correct hook is called when a new database is requested."""
+        _on_database_requested = self.handlers["_on_database_requested"]
         # Simulate the request of a new database plus extra user roles.
         self.harness.update_relation_data(
             self.rel_id,
@@ -174,26 +375,20 @@ class TestDatabaseProvides(DataProvidesBaseTests, unittest.TestCase):
         assert event.database == DATABASE
         assert event.extra_user_roles == EXTRA_USER_ROLES
 
-    def test_set_endpoints(self):
-        """Asserts that the endpoints are in the relation databag when they change."""
-        # Set the endpoints in the relation using the provides charm library.
-        self.harness.charm.provider.set_endpoints(self.rel_id, "host1:port,host2:port")
-
-        # Check that the endpoints are present in the relation.
-        assert (
-            self.harness.get_relation_data(self.rel_id, "database")["endpoints"]
-            == "host1:port,host2:port"
-        )
-
-    def test_set_read_only_endpoints(self):
-        """Asserts that the read only endpoints are in the relation databag when they change."""
+    @parameterized.expand(
+        [
+            ("set_endpoints", "endpoints"),
+            ("set_read_only_endpoints", "read-only-endpoints"),
+        ]
+    )
+    def test_set_endpoints(self, setter: str, key: str):
+        """Asserts that the (read only) endpoints are in the relation databag when they change."""
         # Set the endpoints in the relation using the provides charm library.
-        self.harness.charm.provider.set_read_only_endpoints(self.rel_id, "host1:port,host2:port")
+        getattr(self.harness.charm.provider, setter)(self.rel_id, "host1:port,host2:port")
 
         # Check that the endpoints are present in the relation.
         assert (
-            self.harness.get_relation_data(self.rel_id, "database")["read-only-endpoints"]
-            == "host1:port,host2:port"
+            self.harness.get_relation_data(self.rel_id, "database")[key] == "host1:port,host2:port"
         )
 
     def test_set_additional_fields(self):
@@ -206,39 +401,50 @@ class TestDatabaseProvides(DataProvidesBaseTests, unittest.TestCase):
         self.harness.charm.provider.set_version(self.rel_id, "1.0")
 
         # Check that the additional fields are present in the relation.
-        assert self.harness.get_relation_data(self.rel_id, "database") == {
-            "data": "{}",  # Data is the diff stored between multiple relation changed events.
-            "replset": "rs0",
-            "tls": "True",
-            "tls_ca": "Canonical",
-            "uris": "host1:port,host2:port",
-            "version": "1.0",
-        }
+        assert_databag_contains(
+            self.harness,
+            self.rel_id,
+            "database",
+            {
+                "replset": "rs0",
+                "tls": "True",
+                "tls_ca": "Canonical",
+                "uris": "host1:port,host2:port",
+                "version": "1.0",
+            },
+        )
 
     def test_fetch_relation_data(self):
         # Set some data in the relation.
-        self.harness.update_relation_data(self.rel_id, "application", {"database": DATABASE})
+        self.harness.update_relation_data(self.rel_id, "application", DATABASE_REQUEST)
 
         # Check the data using the charm library function
         # (the diff/data key should not be present).
         data = self.harness.charm.provider.fetch_relation_data()
-        assert data == {self.rel_id: {"database": DATABASE}}
+        assert data == {self.rel_id: DATABASE_REQUEST}
 
     def test_database_requested_event(self):
         # Test custom event creation
 
+        # The mocked charm handler observes the event directly.
+        _on_database_requested = self.handlers["_on_database_requested"]
+
         # Test the event being emitted by the application.
-        with capture(self.harness.charm, DatabaseRequestedEvent) as captured:
-            self.harness.update_relation_data(self.rel_id, "application", {"database": DATABASE})
-        assert captured.event.app.name == "application"
+        self.harness.update_relation_data(self.rel_id, "application", DATABASE_REQUEST)
+        assert _on_database_requested.call_count == 1
+        event = _on_database_requested.call_args[0][0]
+        assert isinstance(event, DatabaseRequestedEvent)
+        assert event.app.name == "application"
 
         # Reset the diff data to trigger the event again later.
         self.harness.update_relation_data(self.rel_id, "database", {"data": "{}"})
 
         # Test the event being emitted by the unit.
-        with capture(self.harness.charm, DatabaseRequestedEvent) as captured:
-            self.harness.update_relation_data(self.rel_id, "application/0", {"database": DATABASE})
-        assert captured.event.unit.name == "application/0"
+        self.harness.update_relation_data(self.rel_id, "application/0", DATABASE_REQUEST)
+        assert _on_database_requested.call_count == 2
+        event = _on_database_requested.call_args[0][0]
+        assert isinstance(event, DatabaseRequestedEvent)
+        assert event.unit.name == "application/0"
 
 
 class TestKafkaProvides(DataProvidesBaseTests, unittest.TestCase):
@@ -247,27 +453,27 @@ class TestKafkaProvides(DataProvidesBaseTests, unittest.TestCase):
     relation_name = KAFKA_RELATION_NAME
     app_name = "kafka"
     charm = KafkaCharm
+    handler_names = ("_on_topic_requested",)
 
-    def get_harness(self) -> Tuple[Harness, int]:
-        harness = Harness(self.charm, meta=self.metadata)
+    @classmethod
+    def get_harness(cls) -> Tuple[Harness, int]:
+        harness = Harness(cls.charm, meta=cls.metadata)
         # Set up the initial relation and hooks.
-        rel_id = harness.add_relation(self.relation_name, "application")
+        rel_id = harness.add_relation(cls.relation_name, "application")
         harness.add_relation_unit(rel_id, "application/0")
         harness.set_leader(True)
         harness.begin_with_initial_hooks()
         return harness, rel_id
 
-    @patch.object(KafkaCharm, "_on_topic_requested")
-    def emit_topic_requested_event(self, _on_topic_requested):
+    def emit_topic_requested_event(self):
         # Emit the topic requested event.
         relation = self.harness.charm.model.get_relation(self.relation_name, self.rel_id)
-        application = self.harness.charm.model.get_app(self.app_name)
-        self.harness.charm.provider.on.topic_requested.emit(relation, application)
-        return _on_topic_requested.call_args[0][0]
+        self.harness.charm.provider.on.topic_requested.emit(relation, self._app)
+        return self.handlers["_on_topic_requested"].call_args[0][0]
 
-    @patch.object(KafkaCharm, "_on_topic_requested")
-    def test_on_topic_requested(self, _on_topic_requested):
+    def test_on_topic_requested(self):
         """Asserts that the correct hook is called when a new topic is requested."""
+        _on_topic_requested = self.handlers["_on_topic_requested"]
         # Simulate the request of a new topic plus extra user roles.
         self.harness.update_relation_data(
             self.rel_id,
@@ -304,38 +510,49 @@ class TestKafkaProvides(DataProvidesBaseTests, unittest.TestCase):
         self.harness.charm.provider.set_zookeeper_uris(self.rel_id, "host1:port,host2:port")
 
         # Check that the additional fields are present in the relation.
-        assert self.harness.get_relation_data(self.rel_id, self.app_name) == {
-            "data": "{}",  # Data is the diff stored between multiple relation changed events.
-            "tls": "True",
-            "tls_ca": "Canonical",
-            "zookeeper-uris": "host1:port,host2:port",
-            "consumer-group-prefix": "pr1,pr2",
-        }
+        assert_databag_contains(
+            self.harness,
+            self.rel_id,
+            self.app_name,
+            {
+                "tls": "True",
+                "tls_ca": "Canonical",
+                "zookeeper-uris": "host1:port,host2:port",
+                "consumer-group-prefix": "pr1,pr2",
+            },
+        )
 
     def test_fetch_relation_data(self):
         # Set some data in the relation.
-        self.harness.update_relation_data(self.rel_id, "application", {"topic": TOPIC})
+        self.harness.update_relation_data(self.rel_id, "application", TOPIC_REQUEST)
 
         # Check the data using the charm library function
         # (the diff/data key should not be present).
         data = self.harness.charm.provider.fetch_relation_data()
-        assert data == {self.rel_id: {"topic": TOPIC}}
+        assert data == {self.rel_id: TOPIC_REQUEST}
 
     def test_topic_requested_event(self):
         # Test custom event creation
 
+        # The mocked charm handler observes the event directly.
+        _on_topic_requested = self.handlers["_on_topic_requested"]
+
         # Test the event being emitted by the application.
-        with capture(self.harness.charm, TopicRequestedEvent) as captured:
-            self.harness.update_relation_data(self.rel_id, "application", {"topic": TOPIC})
-        assert captured.event.app.name == "application"
+        self.harness.update_relation_data(self.rel_id, "application", TOPIC_REQUEST)
+        assert _on_topic_requested.call_count == 1
+        event = _on_topic_requested.call_args[0][0]
+        assert isinstance(event, TopicRequestedEvent)
+        assert event.app.name == "application"
 
         # Reset the diff data to trigger the event again later.
         self.harness.update_relation_data(self.rel_id, self.app_name, {"data": "{}"})
 
         # Test the event being emitted by the unit.
-        with capture(self.harness.charm, TopicRequestedEvent) as captured:
-            self.harness.update_relation_data(self.rel_id, "application/0", {"topic": TOPIC})
-        assert captured.event.unit.name == "application/0"
+        self.harness.update_relation_data(self.rel_id, "application/0", TOPIC_REQUEST)
+        assert _on_topic_requested.call_count == 2
+        event = _on_topic_requested.call_args[0][0]
+        assert isinstance(event, TopicRequestedEvent)
+        assert event.unit.name == "application/0"
 
 
 CLUSTER_ALIASES = ["cluster1", "cluster2"]
@@ -355,6 +572,59 @@ requires:
     interface: {KAFKA_RELATION_INTERFACE}
 """
 TOPIC = "data_platform_topic"
+# Relation data shared by the requirer tests (read-only, so no test can change it for the others).
+CREDENTIALS = MappingProxyType({"username": "test-username", "password": "test-password"})
+DATABASE_ADDITIONAL_FIELDS = MappingProxyType(
+    {
+        "replset": "rs0",
+        "tls": "True",
+        "tls-ca": "Canonical",
+        "uris": "host1:port,host2:port",
+        "version": "1.0",
+    }
+)
+KAFKA_ADDITIONAL_FIELDS = MappingProxyType(
+    {
+        "tls": "True",
+        "tls-ca": "Canonical",
+        "version": "1.0",
+        "zookeeper-uris": "host1:port,host2:port",
+        "consumer-group-prefix": "pr1,pr2",
+    }
+)
+# The database events in the order they are emitted, each one with its name and the relation
+# data that triggers it. The data only holds the keys that change since the previous event
+# (a delta), as update_relation_data merges it into the databag.
+DATABASE_EVENTS = (
+    (
+        DatabaseCreatedEvent,
+        "database_created",
+        MappingProxyType(
+            {
+                **CREDENTIALS,
+                "endpoints": "host1:port",
+                "read-only-endpoints": "host2:port",
+            }
+        ),
+    ),
+    (
+        DatabaseEndpointsChangedEvent,
+        "endpoints_changed",
+        MappingProxyType(
+            {
+                "endpoints": "host1:port,host3:port",
+                "read-only-endpoints": "host2:port,host4:port",
+            }
+        ),
+    ),
+    (
+        DatabaseReadOnlyEndpointsChangedEvent,
+        "read_only_endpoints_changed",
+        MappingProxyType({"read-only-endpoints": "host2:port,host4:port,host5:port"}),
+    ),
+)
+# All the event types that should be checked when something changes in the relation databag.
+DATABASE_EVENT_TYPES = tuple(event for event, _, _ in DATABASE_EVENTS)
 
 
 class ApplicationCharmDatabase(CharmBase):
@@ -405,67 +675,116 @@ class ApplicationCharmKafka(CharmBase):
         pass
 
 
-@pytest.fixture(autouse=True)
+# Names of the custom events created for the aliases.
+_ALIAS_EVENT_NAMES = tuple(
+    f"{cluster_alias}_{suffix}"
+    for cluster_alias in CLUSTER_ALIASES
+    for suffix in ("database_created", "endpoints_changed", "read_only_endpoints_changed")
+)
+
+
 def reset_aliases():
-    """Fixture that runs before each test to delete the custom events created for the aliases.
+    """Deletes the custom events created for the aliases.
 
-    This is needed because the events are created again in the next test,
-    which causes an error related to duplicated events.
+    This is needed because the events are created again when a new harness
+    is set up, which causes an error related to duplicated events.
     """
-    for cluster_alias in CLUSTER_ALIASES:
-        try:
-            delattr(DatabaseRequiresEvents, f"{cluster_alias}_database_created")
-            delattr(DatabaseRequiresEvents, f"{cluster_alias}_endpoints_changed")
-            delattr(DatabaseRequiresEvents, f"{cluster_alias}_read_only_endpoints_changed")
-        except AttributeError:
-            # Ignore the events not existing before the first test.
-            pass
+    for name in _ALIAS_EVENT_NAMES:
+        # Ignore the events not existing before the first test.
+        if name in DatabaseRequiresEvents.__dict__:
+            delattr(DatabaseRequiresEvents, name)
 
 
 class DataRequirerBaseTests(ABC):
+    @classmethod
     @abstractmethod
-    def get_harness(self) -> Tuple[Harness, int]:
+    def get_harness(cls) -> Tuple[Harness, int]:
         pass
 
+    @classmethod
+    def setUpClass(cls):
+        # Setting up the harness (firing all the initial hooks) is the most expensive
+        # part of the tests, so it's done once and its state is restored after each test.
+        cls._harness, cls._rel_id = cls.get_harness()
+        cls._snapshot = snapshot_relation_data(cls._harness, cls.relation_name, cls._rel_id)
+        # Replace the charm event handlers with mocks once for all the tests.
+        cls._patcher = patch.multiple(cls.charm, **{name: DEFAULT for name in cls.handler_names})
+        cls.handlers = cls._patcher.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._patcher.stop()
+        cls._harness.cleanup()
+
     def setUp(self):
-        self.harness, self.rel_id = self.get_harness()
+        self.harness, self.rel_id = self._harness, self._rel_id
+        for handler in self.handlers.values():
+            handler.reset_mock()
+        # The remote application and the local unit used by the tests.
+        self._app = self.harness.charm.model.get_app(self.app_name)
+        self._local_unit = self.harness.charm.unit
 
     def tearDown(self) -> None:
-        self.harness.cleanup()
+        restore_relation_data(self.harness, self.relation_name, self._snapshot, self.rel_id)
 
     def test_diff(self):
         """Asserts that the charm library correctly returns a diff of the relation data."""
-        # Define a mock relation changed event to be used in the subsequent diff calls.
-        mock_event = Mock()
-        # Set the app, id and the initial data for the relation.
-        mock_event.app = self.harness.charm.model.get_app(self.app_name)
-        local_unit = self.harness.charm.model.get_unit("application/0")
-        mock_event.relation.id = self.rel_id
-        mock_event.relation.data = {
-            mock_event.app: {"username": "test-username", "password": "test-password"},
-            local_unit: {},  # Initial empty databag in the local unit.
-        }
-        # Use a variable to easily update the relation changed event data during the test.
+        # Define a relation changed event to be used in the subsequent diff calls
+        # with the app, id and the initial data for the relation.
+        app, local_unit = self._app, self._local_unit
+        relation = StubRelation(
+            self.rel_id,
+            {
+                app: {"username": "test-username", "password": "test-password"},
+                local_unit: {},  # Initial empty databag in the local unit.
+            },
+        )
+        mock_event = StubRelationEvent(app, relation)
+        # Use variables to easily update the relation changed event data during the test.
         data = mock_event.relation.data[mock_event.app]
-
-        # Test with new data added to the relation databag.
-        result = self.harness.charm.requirer._diff(mock_event)
-        assert result == Diff({"username", "password"}, set(), set())
-
-        # Test with the same data.
-        result = self.harness.charm.requirer._diff(mock_event)
-        assert result == Diff(set(), set(), set())
-
-        # Test with changed data.
-        data["username"] = "test-username-1"
-        result = self.harness.charm.requirer._diff(mock_event)
-        assert result == Diff(set(), {"username"}, set())
-
-        # Test with deleted data.
-        del data["username"]
-        del data["password"]
-        result = self.harness.charm.requirer._diff(mock_event)
-        assert result == Diff(set(), set(), {"username", "password"})
+        local_data = mock_event.relation.data[local_unit]
+
+        # Each case is made of the databag to change, the changes to apply to it (a None
+        # value deletes the key) and the diff expected after them.
+        cases = [
+            # Test with new data added to the relation databag.
+            (data, {}, Diff(CREDENTIAL_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with the same data.
+            (data, {}, Diff(NO_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with changed data.
+            (data, {"username": "test-username-1"}, Diff(NO_KEYS, USERNAME_KEYS, NO_KEYS)),
+            # Test with the stored data reset (the previous data is always read from the databag).
+            (local_data, {"data": None}, Diff(CREDENTIAL_KEYS, NO_KEYS, NO_KEYS)),
+            # Test with deleted data.
+            (data, {"username": None, "password": None}, Diff(NO_KEYS, NO_KEYS, CREDENTIAL_KEYS)),
+        ]
+        for databag, changes, expected in cases:
+            for key, value in changes.items():
+                if value is None:
+                    del databag[key]
+                else:
+                    databag[key] = value
+            assert self.harness.charm.requirer._diff(mock_event) == expected
+
+    def test_fetch_relation_data_without_relation_events(self):
+        """Asserts the relation data is read from the databag even when no event was fired."""
+        with self.harness.hooks_disabled():
+            self.harness.update_relation_data(self.rel_id, self.app_name, {"tls": "True"})
+        data = self.harness.charm.requirer.fetch_relation_data()
+        assert data[self.rel_id]["tls"] == "True"
+
+        # Changes to the returned data are not seen by the next calls.
+        data[self.rel_id]["tls"] = "False"
+        assert self.harness.charm.requirer.fetch_relation_data()[self.rel_id]["tls"] == "True"
+
+    def test_fetch_relation_data_is_refreshed_on_change(self):
+        """Asserts the relation data returned by the charm library follows the databag changes."""
+        self.harness.update_relation_data(self.rel_id, self.app_name, {"tls": "True"})
+        assert self.harness.charm.requirer.fetch_relation_data()[self.rel_id]["tls"] == "True"
+
+        # Change the data and check the updated value is returned.
+        self.harness.update_relation_data(self.rel_id, self.app_name, {"tls": "False"})
+        assert self.harness.charm.requirer.fetch_relation_data()[self.rel_id]["tls"] == "False"
 
 
 class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
@@ -473,24 +792,37 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
     relation_name = DATABASE_RELATION_NAME
     app_name = "database"
     charm = ApplicationCharmDatabase
+    handler_names = (
+        "_on_database_created",
+        "_on_endpoints_changed",
+        "_on_read_only_endpoints_changed",
+        "_on_cluster1_database_created",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        # Delete the aliased events left by other tests before the charm defines them again.
+        reset_aliases()
+        super().setUpClass()
+        # Record the database events (including the aliased ones) for all the tests.
+        cls._recorder = EventRecorder(
+            cls._harness.charm, cls._harness.charm.requirer.on, DATABASE_EVENT_TYPES
+        )
 
-    def get_harness(self) -> Tuple[Harness, int]:
-        harness = Harness(self.charm, meta=self.metadata)
+    @classmethod
+    def get_harness(cls) -> Tuple[Harness, int]:
+        harness = Harness(cls.charm, meta=cls.metadata)
         rel_id = harness.add_relation(DATABASE_RELATION_NAME, "database")
         harness.add_relation_unit(rel_id, "database/0")
         harness.set_leader(True)
         harness.begin_with_initial_hooks()
         return harness, rel_id
 
-    @patch.object(charm, "_on_database_created")
-    def test_on_database_created(self, _on_database_created):
+    def test_on_database_created(self):
         """Asserts on_database_created is called when the credentials are set in the relation."""
+        _on_database_created = self.handlers["_on_database_created"]
         # Simulate sharing the credentials of a new created database.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {"username": "test-username", "password": "test-password"},
-        )
+        self.harness.update_relation_data(self.rel_id, self.app_name, CREDENTIALS)
 
         # Assert the correct hook is called.
         _on_database_created.assert_called_once()
@@ -501,9 +833,9 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
         assert event.username == "test-username"
         assert event.password == "test-password"
 
-    @patch.object(charm, "_on_endpoints_changed")
-    def test_on_endpoints_changed(self, _on_endpoints_changed):
+    def test_on_endpoints_changed(self):
         """Asserts the correct call to on_endpoints_changed."""
+        _on_endpoints_changed = self.handlers["_on_endpoints_changed"]
         # Simulate adding endpoints to the relation.
         self.harness.update_relation_data(
             self.rel_id,
@@ -519,18 +851,16 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
         event = _on_endpoints_changed.call_args[0][0]
         assert event.endpoints == "host1:port,host2:port"
 
-        # Reset the mock call count.
-        _on_endpoints_changed.reset_mock()
-
-        # Set the same data in the relation (no change in the endpoints).
+        # Set the same endpoints together with another field in a single update, so the
+        # relation changed event is still fired (there is no change in the endpoints).
         self.harness.update_relation_data(
             self.rel_id,
             self.app_name,
-            {"endpoints": "host1:port,host2:port"},
+            {"endpoints": "host1:port,host2:port", "tls": "True"},
         )
 
         # Assert the hook was not called again.
-        _on_endpoints_changed.assert_not_called()
+        assert _on_endpoints_changed.call_count == 1
 
         # Then, change the endpoints in the relation.
         self.harness.update_relation_data(
@@ -539,12 +869,12 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
             {"endpoints": "host1:port,host2:port,host3:port"},
         )
 
-        # Assert the hook is called now.
-        _on_endpoints_changed.assert_called_once()
+        # Assert the hook is called now (for the second time).
+        assert _on_endpoints_changed.call_count == 2
 
-    @patch.object(charm, "_on_read_only_endpoints_changed")
-    def test_on_read_only_endpoints_changed(self, _on_read_only_endpoints_changed):
+    def test_on_read_only_endpoints_changed(self):
         """Asserts the correct call to on_read_only_endpoints_changed."""
+        _on_read_only_endpoints_changed = self.handlers["_on_read_only_endpoints_changed"]
         # Simulate adding endpoints to the relation.
         self.harness.update_relation_data(
             self.rel_id,
@@ -560,18 +890,16 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
         event = _on_read_only_endpoints_changed.call_args[0][0]
         assert event.read_only_endpoints == "host1:port,host2:port"
 
-        # Reset the mock call count.
-        _on_read_only_endpoints_changed.reset_mock()
-
-        # Set the same data in the relation (no change in the endpoints).
+        # Set the same endpoints together with another field in a single update, so the
+        # relation changed event is still fired (there is no change in the endpoints).
         self.harness.update_relation_data(
             self.rel_id,
             self.app_name,
-            {"read-only-endpoints": "host1:port,host2:port"},
+            {"read-only-endpoints": "host1:port,host2:port", "tls": "True"},
         )
 
         # Assert the hook was not called again.
-        _on_read_only_endpoints_changed.assert_not_called()
+        assert _on_read_only_endpoints_changed.call_count == 1
 
         # Then, change the endpoints in the relation.
         self.harness.update_relation_data(
@@ -580,23 +908,13 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
             {"read-only-endpoints": "host1:port,host2:port,host3:port"},
         )
 
-        # Assert the hook is called now.
-        _on_read_only_endpoints_changed.assert_called_once()
+        # Assert the hook is called now (for the second time).
+        assert _on_read_only_endpoints_changed.call_count == 2
 
     def test_additional_fields_are_accessible(self):
         """Asserts additional fields are accessible using the charm library after being set."""
         # Simulate setting the additional fields.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {
-                "replset": "rs0",
-                "tls": "True",
-                "tls-ca": "Canonical",
-                "uris": "host1:port,host2:port",
-                "version": "1.0",
-            },
-        )
+        self.harness.update_relation_data(self.rel_id, self.app_name, DATABASE_ADDITIONAL_FIELDS)
 
         # Check that the fields are present in the relation
         # using the requires charm library.
@@ -607,43 +925,42 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
         assert relation_data["uris"] == "host1:port,host2:port"
         assert relation_data["version"] == "1.0"
 
-    @patch.object(charm, "_on_database_created")
-    def test_fields_are_accessible_through_event(self, _on_database_created):
+    def test_fields_are_accessible_through_event(self):
         """Asserts fields are accessible through the requires charm library event."""
+        _on_database_created = self.handlers["_on_database_created"]
         # Simulate setting the additional fields.
         self.harness.update_relation_data(
             self.rel_id,
             self.app_name,
             {
-                "username": "test-username",
-                "password": "test-password",
+                **CREDENTIALS,
                 "endpoints": "host1:port,host2:port",
                 "read-only-endpoints": "host1:port,host2:port",
-                "replset": "rs0",
-                "tls": "True",
-                "tls-ca": "Canonical",
-                "uris": "host1:port,host2:port",
-                "version": "1.0",
+                **DATABASE_ADDITIONAL_FIELDS,
             },
         )
 
         # Check that the fields are present in the relation
         # using the requires charm library event.
         event = _on_database_created.call_args[0][0]
-        assert event.username == "test-username"
-        assert event.password == "test-password"
-        assert event.endpoints == "host1:port,host2:port"
-        assert event.read_only_endpoints == "host1:port,host2:port"
-        assert event.replset == "rs0"
-        assert event.tls == "True"
-        assert event.tls_ca == "Canonical"
-        assert event.uris == "host1:port,host2:port"
-        assert event.version == "1.0"
+        expected = {
+            "username": "test-username",
+            "password": "test-password",
+            "endpoints": "host1:port,host2:port",
+            "read_only_endpoints": "host1:port,host2:port",
+            "replset": "rs0",
+            "tls": "True",
+            "tls_ca": "Canonical",
+            "uris": "host1:port,host2:port",
+            "version": "1.0",
+        }
+        assert event_to_dict(event, expected) == expected
 
     def test_assign_relation_alias(self):
         """Asserts the correct relation alias is assigned to the relation."""
         # Reset the alias.
         self.harness.update_relation_data(self.rel_id, "application/0", {"alias": ""})
+        assert self.harness.charm.requirer._get_relation_alias(self.rel_id) is None
 
         # Call the function and check the alias.
         self.harness.charm.requirer._assign_relation_alias(self.rel_id)
@@ -668,9 +985,9 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
             == CLUSTER_ALIASES[1]
         )
 
-    @patch.object(charm, "_on_cluster1_database_created")
-    def test_emit_aliased_event(self, _on_cluster1_database_created):
+    def test_emit_aliased_event(self):
         """Asserts the correct custom event is triggered."""
+        _on_cluster1_database_created = self.handlers["_on_cluster1_database_created"]
         # Reset the diff/data key in the relation to correctly emit the event.
         self.harness.update_relation_data(self.rel_id, "application", {"data": "{}"})
 
@@ -679,10 +996,7 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
 
         # Call the emit function and assert the desired event is triggered.
         relation = self.harness.charm.model.get_relation(DATABASE_RELATION_NAME, self.rel_id)
-        mock_event = Mock()
-        mock_event.app = self.harness.charm.model.get_app("application")
-        mock_event.unit = self.harness.charm.model.get_unit("application/0")
-        mock_event.relation = relation
+        mock_event = StubRelationEvent(self.harness.charm.app, relation, unit=self._local_unit)
         self.harness.charm.requirer._emit_aliased_event(mock_event, "database_created")
         _on_cluster1_database_created.assert_called_once()
 
@@ -691,85 +1005,59 @@ class TestDatabaseRequires(DataRequirerBaseTests, unittest.TestCase):
         # Assert the relation got the first cluster alias.
         assert self.harness.charm.requirer._get_relation_alias(self.rel_id) == CLUSTER_ALIASES[0]
 
-    @parameterized.expand([(True,), (False,)])
-    def test_database_events(self, is_leader: bool):
-        # Test custom events creation
-        # Test that the events are emitted to both the leader
-        # and the non-leader units through is_leader parameter.
-        self.harness.set_leader(is_leader)
-
-        # Define the events that need to be emitted.
-        # The event key is the event that should have been emitted
-        # and the data key is the data that will be updated in the
-        # relation databag to trigger that event.
-        events = [
-            {
-                "event": DatabaseCreatedEvent,
-                "data": {
-                    "username": "test-username",
-                    "password": "test-password",
-                    "endpoints": "host1:port",
-                    "read-only-endpoints": "host2:port",
-                },
-            },
-            {
-                "event": DatabaseEndpointsChangedEvent,
-                "data": {
-                    "endpoints": "host1:port,host3:port",
-                    "read-only-endpoints": "host2:port,host4:port",
-                },
-            },
-            {
-                "event": DatabaseReadOnlyEndpointsChangedEvent,
-                "data": {
-                    "read-only-endpoints": "host2:port,host4:port,host5:port",
-                },
-            },
-        ]
+        # Assert no alias is returned for a relation that doesn't exist.
+        assert self.harness.charm.requirer._get_relation_alias(self.rel_id + 100) is None
 
-        # Define the list of all events that should be checked
-        # when something changes in the relation databag.
-        all_events = [event["event"] for event in events]
+    def test_database_events(self):
+        # Test custom events creation
+        # Test that the events are emitted to both the leader and the non-leader units.
+        for is_leader in (True, False):
+            with self.subTest(is_leader=is_leader):
+                # Start each scenario from the initial relation data.
+                restore_relation_data(
+                    self.harness, self.relation_name, self._snapshot, self.rel_id
+                )
+                self.harness.set_leader(is_leader)
+                self.check_database_events()
+
+    def check_database_events(self):
+        """Asserts each database event is emitted by the application and by the unit."""
+        harness, rel_id = self.harness, self.rel_id
+        captured_events = self._recorder.events
+
+        # Each event is checked after updating the relation databag with its data. Every step
+        # starts from the state left by the previous one, so a failing step ends the scenario.
+        for _, name, data in DATABASE_EVENTS:
+            # The event without alias and the one with the alias of the relation.
+            expected_events = sorted([name, f"{CLUSTER_ALIASES[0]}_{name}"])
 
-        for event in events:
             # Diff stored in the data field of the relation databag in the previous event.
             # This is important to test the next events in a consistent way.
-            previous_event_diff = self.harness.get_relation_data(self.rel_id, "application/0").get(
-                "data"
-            )
+            previous_event_diff = harness.get_relation_data(rel_id, "application/0").get("data")
 
             # Test the event being emitted by the application.
-            with capture_events(self.harness.charm, *all_events) as captured_events:
-                self.harness.update_relation_data(self.rel_id, "database", event["data"])
-
-            # There are two events (one aliased and the other without alias).
-            assert len(captured_events) == 2
+            captured_events.clear()
+            harness.update_relation_data(rel_id, "database", data)
 
-            # Check that the events that were emitted are the ones that were expected.
-            assert all(
-                isinstance(captured_event, event["event"]) for captured_event in captured_events
-            )
+            # Check that only the expected events were emitted (the recorder observes all the
+            # database events): one aliased and the other without alias.
+            assert sorted(captured.handle.kind for captured in captured_events) == expected_events
 
             # Test that the remote app name is available in the event.
             for captured in captured_events:
                 assert captured.app.name == "database"
 
-            # Reset the diff data to trigger the event again later.
-            self.harness.update_relation_data(
-                self.rel_id, "application/0", {"data": previous_event_diff}
-            )
+            # Reset the diff data to trigger the event again later (this only writes to
+            # the local unit databag, which doesn't fire any relation changed event).
+            harness.update_relation_data(rel_id, "application/0", {"data": previous_event_diff})
 
             # Test the event being emitted by the unit.
-            with capture_events(self.harness.charm, *all_events) as captured_events:
-                self.harness.update_relation_data(self.rel_id, "database/0", event["data"])
+            captured_events.clear()
+            harness.update_relation_data(rel_id, "database/0", data)
 
-            # There are two events (one aliased and the other without alias).
-            assert len(captured_events) == 2
-
-            # Check that the events that were emitted are the ones that were expected.
-            assert all(
-                isinstance(captured_event, event["event"]) for captured_event in captured_events
-            )
+            # Check that only the expected events were emitted (the recorder observes all the
+            # database events): one aliased and the other without alias.
+            assert sorted(captured.handle.kind for captured in captured_events) == expected_events
 
             # Test that the remote unit name is available in the event.
             for captured in captured_events:
@@ -781,24 +1069,22 @@ class TestKakfaRequires(DataRequirerBaseTests, unittest.TestCase):
     relation_name = KAFKA_RELATION_NAME
     app_name = "kafka"
     charm = ApplicationCharmKafka
+    handler_names = ("_on_topic_created", "_on_bootstrap_server_changed")
 
-    def get_harness(self) -> Tuple[Harness, int]:
-        harness = Harness(self.charm, meta=self.metadata)
-        rel_id = harness.add_relation(KAFKA_RELATION_NAME, self.app_name)
-        harness.add_relation_unit(rel_id, f"{self.app_name}/0")
+    @classmethod
+    def get_harness(cls) -> Tuple[Harness, int]:
+        harness = Harness(cls.charm, meta=cls.metadata)
+        rel_id = harness.add_relation(KAFKA_RELATION_NAME, cls.app_name)
+        harness.add_relation_unit(rel_id, f"{cls.app_name}/0")
         harness.set_leader(True)
         harness.begin_with_initial_hooks()
         return harness, rel_id
 
-    @patch.object(charm, "_on_topic_created")
-    def test_on_topic_created(self, _on_topic_created):
+    def test_on_topic_created(self):
         """Asserts on_topic_created is called when the credentials are set in the relation."""
+        _on_topic_created = self.handlers["_on_topic_created"]
         # Simulate sharing the credentials of a new created topic.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {"username": "test-username", "password": "test-password"},
-        )
+        self.harness.update_relation_data(self.rel_id, self.app_name, CREDENTIALS)
 
         # Assert the correct hook is called.
         _on_topic_created.assert_called_once()
@@ -809,61 +1095,33 @@ class TestKakfaRequires(DataRequirerBaseTests, unittest.TestCase):
         assert event.username == "test-username"
         assert event.password == "test-password"
 
-    @patch.object(charm, "_on_bootstrap_server_changed")
-    def test_on_bootstrap_server_changed(self, _on_bootstrap_server_changed):
+    def test_on_bootstrap_server_changed(self):
         """Asserts the correct call to _on_bootstrap_server_changed."""
-        # Simulate adding endpoints to the relation.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {"endpoints": "host1:port,host2:port"},
-        )
-
-        # Assert the correct hook is called.
-        _on_bootstrap_server_changed.assert_called_once()
+        _on_bootstrap_server_changed = self.handlers["_on_bootstrap_server_changed"]
+        # Each step is an update of the relation data and the number of times
+        # the hook should have been called after it.
+        steps = [
+            # Simulate adding endpoints to the relation.
+            ({"endpoints": "host1:port,host2:port"}, 1),
+            # Set the same endpoints together with another field in a single update, so the
+            # relation changed event is still fired (there is no change in the endpoints).
+            ({"endpoints": "host1:port,host2:port", "tls": "True"}, 1),
+            # Then, change the endpoints in the relation.
+            ({"endpoints": "host1:port,host2:port,host3:port"}, 2),
+        ]
+        for data, call_count in steps:
+            self.harness.update_relation_data(self.rel_id, self.app_name, data)
+            assert _on_bootstrap_server_changed.call_count == call_count
 
-        # Check that the endpoints are present in the relation
+        # Check that the last endpoints are present in the relation
         # using the requires charm library event.
         event = _on_bootstrap_server_changed.call_args[0][0]
-        assert event.bootstrap_server == "host1:port,host2:port"
-
-        # Reset the mock call count.
-        _on_bootstrap_server_changed.reset_mock()
-
-        # Set the same data in the relation (no change in the endpoints).
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {"endpoints": "host1:port,host2:port"},
-        )
-
-        # Assert the hook was not called again.
-        _on_bootstrap_server_changed.assert_not_called()
-
-        # Then, change the endpoints in the relation.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {"endpoints": "host1:port,host2:port,host3:port"},
-        )
-
-        # Assert the hook is called now.
-        _on_bootstrap_server_changed.assert_called_once()
+        assert event.bootstrap_server == "host1:port,host2:port,host3:port"
 
     def test_additional_fields_are_accessible(self):
         """Asserts additional fields are accessible using the charm library after being set."""
         # Simulate setting the additional fields.
-        self.harness.update_relation_data(
-            self.rel_id,
-            self.app_name,
-            {
-                "tls": "True",
-                "tls-ca": "Canonical",
-                "version": "1.0",
-                "zookeeper-uris": "host1:port,host2:port",
-                "consumer-group-prefix": "pr1,pr2",
-            },
-        )
+        self.harness.update_relation_data(self.rel_id, self.app_name, KAFKA_ADDITIONAL_FIELDS)
 
         # Check that the fields are present in the relation
         # using the requires charm library.
@@ -874,16 +1132,15 @@ class TestKakfaRequires(DataRequirerBaseTests, unittest.TestCase):
         assert relation_data["zookeeper-uris"] == "host1:port,host2:port"
         assert relation_data["consumer-group-prefix"] == "pr1,pr2"
 
-    @patch.object(charm, "_on_topic_created")
-    def test_fields_are_accessible_through_event(self, _on_topic_created):
+    def test_fields_are_accessible_through_event(self):
         """Asserts fields are accessible through the requires charm library event."""
+        _on_topic_created = self.handlers["_on_topic_created"]
         # Simulate setting the additional fields.
         self.harness.update_relation_data(
             self.rel_id,
             self.app_name,
             {
-                "username": "test-username",
-                "password": "test-password",
+                **CREDENTIALS,
                 "endpoints": "host1:port,host2:port",
                 "tls": "True",
                 "tls-ca": "Canonical",
@@ -895,10 +1152,13 @@ class TestKakfaRequires(DataRequirerBaseTests, unittest.TestCase):
         # Check that the fields are present in the relation
         # using the requires charm library event.
         event = _on_topic_created.call_args[0][0]
-        assert event.username == "test-username"
-        assert event.password == "test-password"
-        assert event.bootstrap_server == "host1:port,host2:port"
-        assert event.tls == "True"
-        assert event.tls_ca == "Canonical"
-        assert event.zookeeper_uris == "h1:port,h2:port"
-        assert event.consumer_group_prefix == "pr1,pr2"
+        expected = {
+            "username": "test-username",
+            "password": "test-password",
+            "bootstrap_server": "host1:port,host2:port",
+            "tls": "True",
+            "tls_ca": "Canonical",
+            "zookeeper_uris": "h1:port,h2:port",
+            "consumer_group_prefix": "pr1,pr2",
+        }
+        assert event_to_dict(event, expected) == expected